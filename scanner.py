@@ -16,16 +16,32 @@ Notes:
 """
 
 import argparse
+import asyncio
 import requests
 import sqlite3
 import time
 import random
+import math
+import re
 import hashlib
+import functools
 import sys
+import os
+import gzip
+import json
+import tempfile
 from datetime import datetime
 from urllib.parse import quote_plus
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+import ijson
 import urllib3
+from requests.adapters import HTTPAdapter
+
+try:
+    import blake3  # optional: faster fingerprints, see USE_BLAKE3
+except ImportError:
+    blake3 = None
 
 # Disable SSL warnings for domains with certificate issues
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -64,13 +80,53 @@ USER_AGENT = "WebWhisper/1.0 (+https://example.local)"
 REQUEST_TIMEOUT = 20
 SLEEP_BETWEEN_REQUESTS = 1.0  # polite delay
 DEFAULT_TLDS = ["com", "net", "org", "io", "co", "uk", "de", "fr", "ca", "au", "jp", "cn", "in", "br", "ru", "nl", "it", "es", "se", "no", "pl", "be", "ch", "at", "dk", "fi", "cz", "pt", "gr", "nz"]
+CRTSH_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "webwhisper", "crtsh")
+CRTSH_CACHE_TTL = 3600  # seconds a cached per-TLD crt.sh result stays fresh
+CRTSH_WORKERS = 6  # concurrent crt.sh queries (one per TLD)
 MAX_RESULTS_FETCH = 3000  # safety cap on how many JSON entries we'll ingest per TLD request
 LIVE_CHECK_TIMEOUT = 5  # timeout for checking if domain is live
-MAX_WORKERS = 20  # concurrent threads for live checking
+MAX_CONNECTIONS = 500  # concurrent sockets for live checking
+PROGRESS_EVERY = 50  # live-check progress: redraw after this many results...
+PROGRESS_INTERVAL = 0.1  # ...or after this many seconds
+# BLAKE3 fingerprints (first 32 hex chars) are faster than SHA-256 but not comparable with
+# existing rows. The scheme is recorded in the DB (PRAGMA user_version) on first use and
+# init_db refuses a mismatch. Falls back to SHA-256 if blake3 is missing.
+USE_BLAKE3 = False
+FP_SCHEME_SHA256 = 0  # user_version of DBs created before the scheme was recorded
+FP_SCHEME_BLAKE3 = 1
+MAX_PER_APEX = 2  # hosts per registered domain (foo.x.com, www.foo.x.com...) tried before backfilling
+_SECOND_LEVEL_LABELS = {"co", "com", "net", "org", "gov", "edu", "ac", "or", "ne", "go"}
+MIN_SAMPLE_BATCH = 20  # smallest batch of candidates drawn per sampling round
+MIN_LIVE_RATE = 0.05  # floor on the measured live rate when sizing the next batch
+MAX_PROBE_FACTOR = 20  # live-check at most count * this many candidates per run
+SQL_PARAM_CHUNK = 900  # stay under SQLite's default 999 bound-parameter limit
+# One name per line: trims whitespace, strips a leading "*." wildcard and skips dot-less junk
+_NAME_RE = re.compile(r"^[^\S\n]*(?:\*\.)?([^\s*]\S*\.\S*?)[^\S\n]*$", re.M)
+_BAD_CHARS = re.compile(r"[\s<>\\\"']").search  # sanity filter for candidate domains
+DB_PRAGMAS = ("journal_mode=WAL", "synchronous=NORMAL", "temp_store=MEMORY", "mmap_size=268435456", "cache_size=-65536")
+
+# Shared session so repeated crt.sh queries reuse the same TCP+TLS connection
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=CRTSH_WORKERS, pool_maxsize=CRTSH_WORKERS, max_retries=0))
+_SESSION.mount("http://", HTTPAdapter(pool_connections=CRTSH_WORKERS, pool_maxsize=CRTSH_WORKERS, max_retries=0))
 
 # === DB ===
+@functools.lru_cache(maxsize=100000)
+def _fp(domain):
+    """SHA-256 (or BLAKE3, see USE_BLAKE3) fingerprint of a domain, memoized across dedup and insert."""
+    if USE_BLAKE3 and blake3 is not None:
+        return blake3.blake3(domain.encode('utf-8')).hexdigest()[:32]
+    return hashlib.sha256(domain.encode('utf-8')).hexdigest()
+
+def _fp_scheme():
+    """Fingerprint scheme _fp() actually uses, as stored in PRAGMA user_version."""
+    return FP_SCHEME_BLAKE3 if USE_BLAKE3 and blake3 is not None else FP_SCHEME_SHA256
+
 def init_db(path=DB_PATH):
     conn = sqlite3.connect(path)
+    # WAL + relaxed sync: far fewer fsyncs on the frequent small writes
+    for pragma in DB_PRAGMAS:
+        conn.execute("PRAGMA " + pragma)
     cur = conn.cursor()
     cur.execute("""
         CREATE TABLE IF NOT EXISTS seen_domains (
@@ -81,63 +137,115 @@ def init_db(path=DB_PATH):
         )
     """)
     conn.commit()
+    
+    # Fingerprints from different schemes never match, so a DB sticks to the one it was filled with
+    scheme = _fp_scheme()
+    stored = cur.execute("PRAGMA user_version").fetchone()[0]
+    if stored != scheme:
+        if cur.execute("SELECT 1 FROM seen_domains LIMIT 1").fetchone() is None:
+            conn.execute(f"PRAGMA user_version = {scheme}")
+        else:
+            names = {FP_SCHEME_SHA256: "SHA-256", FP_SCHEME_BLAKE3: "BLAKE3"}
+            print(f"{Colors.RED}[!] {path} holds {names.get(stored, stored)} fingerprints but this run uses "
+                  f"{names[scheme]}; set USE_BLAKE3 to match or start a fresh DB.{Colors.ENDC}", file=sys.stderr)
+            conn.close()
+            sys.exit(1)
     return conn
 
-def mark_seen(conn, domain):
+def mark_seen_bulk(conn, domains):
+    """Insert many domains in one transaction (a single commit instead of one per row)."""
+    rows = [(d, _fp(d)) for d in domains]
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO seen_domains (domain, fingerprint) VALUES (?, ?)", rows)
+
+def seen_fingerprints(conn, fingerprints):
+    """Return the subset of `fingerprints` already stored, using chunked IN (...) queries."""
+    fingerprints = list(fingerprints)
+    seen = set()
     cur = conn.cursor()
-    fp = hashlib.sha256(domain.encode('utf-8')).hexdigest()
-    try:
-        cur.execute("INSERT INTO seen_domains (domain, fingerprint) VALUES (?, ?)", (domain, fp))
-        conn.commit()
-        return True
-    except Exception:
-        return False
+    for i in range(0, len(fingerprints), SQL_PARAM_CHUNK):
+        chunk = fingerprints[i:i + SQL_PARAM_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        cur.execute(f"SELECT fingerprint FROM seen_domains WHERE fingerprint IN ({placeholders})", chunk)
+        seen.update(r[0] for r in cur.fetchall())
+    return seen
 
-def already_seen(conn, domain):
+def sample_db_fast(conn, n):
+    """
+    Return up to `n` random domains from the DB.
+    Probes random primary keys instead of ORDER BY RANDOM(), which sorts the whole table.
+    """
     cur = conn.cursor()
-    fp = hashlib.sha256(domain.encode('utf-8')).hexdigest()
-    cur.execute("SELECT 1 FROM seen_domains WHERE fingerprint = ? LIMIT 1", (fp,))
-    return cur.fetchone() is not None
+    cur.execute("SELECT MAX(id) FROM seen_domains")
+    max_id = cur.fetchone()[0]
+    if not max_id:
+        return []
+    if n >= max_id:
+        # asking for (nearly) everything: a plain scan is cheaper than probing
+        cur.execute("SELECT domain FROM seen_domains")
+        domains = [r[0] for r in cur.fetchall()]
+        random.shuffle(domains)
+        return domains[:n]
+    
+    domains = []
+    tried = set()
+    # ids can have gaps, so keep drawing fresh ids until we have enough or run out
+    while len(domains) < n and len(tried) < max_id:
+        need = min(n - len(domains), max_id - len(tried))
+        ids = set()
+        while len(ids) < need:
+            rid = random.randint(1, max_id)
+            if rid not in tried:
+                ids.add(rid)
+                tried.add(rid)
+        ids = list(ids)
+        for i in range(0, len(ids), SQL_PARAM_CHUNK):
+            chunk = ids[i:i + SQL_PARAM_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            cur.execute(f"SELECT domain FROM seen_domains WHERE id IN ({placeholders})", chunk)
+            domains.extend(r[0] for r in cur.fetchall())
+    return domains
 
 # === Live domain checking ===
-def check_domain_live(domain):
+_PROTOCOLS = ('https://', 'http://')
+_CHECK_HEADERS = {'User-Agent': USER_AGENT}
+# SSL, connection, redirect and bad-URL errors are all aiohttp.ClientError subclasses
+_SKIP_EXC = (aiohttp.ClientError, asyncio.TimeoutError, ValueError)
+_HEAD_REJECTED = (400, 403, 405, 501)  # statuses that usually mean "HEAD not supported"
+# Progress lines, with the color codes baked in once
+_LIVE_FMT = Colors.GREEN + "[✓] {} ({}) - {}/{}" + Colors.ENDC + "\r"
+_DEAD_FMT = Colors.RED + "[✗] {} - {}/{}" + Colors.ENDC + "\r"
+_ERR_FMT = Colors.RED + "[✗] Error checking domain - {}/{}" + Colors.ENDC + "\r"
+
+async def check_domain_live(session, domain):
     """
     Check if domain is live by attempting HTTP/HTTPS connections.
     Returns (domain, True) if status 200, else (domain, False)
     """
-    protocols = ['https://', 'http://']
-    headers = {'User-Agent': USER_AGENT}
-    
-    for protocol in protocols:
+    for protocol in _PROTOCOLS:
+        url = f"{protocol}{domain}"
         try:
-            url = f"{protocol}{domain}"
-            response = requests.get(
-                url, 
-                headers=headers, 
-                timeout=LIVE_CHECK_TIMEOUT, 
-                allow_redirects=True,
-                verify=False  # Skip SSL verification for domains with cert issues
-            )
-            if response.status_code == 200:
-                return (domain, True, response.status_code, protocol)
-        except requests.exceptions.SSLError:
-            # Try with verify=False already set, continue to next protocol
-            continue
-        except requests.exceptions.ConnectionError:
-            continue
-        except requests.exceptions.Timeout:
-            continue
-        except requests.exceptions.TooManyRedirects:
-            continue
-        except Exception:
+            # HEAD avoids transferring the body; only the status code matters
+            async with session.head(url, headers=_CHECK_HEADERS, allow_redirects=True, ssl=False) as response:
+                status = response.status
+            if status in _HEAD_REJECTED:
+                # some servers refuse HEAD; fall back to GET and close without reading the body
+                async with session.get(url, headers=_CHECK_HEADERS, allow_redirects=True, ssl=False) as response:
+                    status = response.status
+        except _SKIP_EXC:
             continue
+        if status == 200:
+            return (domain, True, status, protocol)
+        if 200 <= status < 400:
+            # host answered cleanly over HTTPS; probing plain HTTP won't change the verdict
+            break
     
     return (domain, False, None, None)
 
-def filter_live_domains(domains, show_progress=True):
+async def filter_live_domains_async(domains, show_progress=True):
     """
     Filter domains to only return those with HTTP 200 status.
-    Uses ThreadPoolExecutor for concurrent checking.
+    Runs all checks on one event loop sharing a single aiohttp session.
     """
     live_domains = []
     total = len(domains)
@@ -146,75 +254,140 @@ def filter_live_domains(domains, show_progress=True):
     if show_progress:
         print(f"{Colors.CYAN}[*] Checking {total} domains for live status (HTTP 200)...{Colors.ENDC}")
     
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_domain = {executor.submit(check_domain_live, domain): domain for domain in domains}
+    connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, ssl=False, ttl_dns_cache=300)
+    # Time the connect and each read separately, like requests does, rather than a total:
+    # a total would also count DNS lookups queued behind the resolver's small thread pool
+    timeout = aiohttp.ClientTimeout(sock_connect=LIVE_CHECK_TIMEOUT, sock_read=LIVE_CHECK_TIMEOUT)
+    # Cap in-flight checks at the connector limit so requests don't pile up waiting for a connection
+    semaphore = asyncio.Semaphore(MAX_CONNECTIONS)
+    
+    async def bounded_check(session, domain):
+        async with semaphore:
+            return await check_domain_live(session, domain)
+    
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        tasks = [bounded_check(session, domain) for domain in domains]
         
-        for future in as_completed(future_to_domain):
+        # Progress is throttled: one status line per PROGRESS_EVERY results or PROGRESS_INTERVAL seconds
+        last_printed = 0
+        last_flush = time.monotonic()
+        for next_done in asyncio.as_completed(tasks):
             checked += 1
             try:
-                domain, is_live, status, protocol = future.result()
-                if is_live:
-                    live_domains.append(domain)
-                    if show_progress:
-                        print(f"{Colors.GREEN}[✓] {domain} ({protocol[:-3].upper()}) - {checked}/{total}{Colors.ENDC}")
-                else:
-                    if show_progress:
-                        print(f"{Colors.RED}[✗] {domain} - {checked}/{total}{Colors.ENDC}", end='\r')
-            except Exception as e:
-                if show_progress:
-                    print(f"{Colors.RED}[✗] Error checking domain - {checked}/{total}{Colors.ENDC}", end='\r')
+                domain, is_live, _, protocol = await next_done
+            except Exception:
+                domain, is_live, protocol = None, False, None
+            if is_live:
+                live_domains.append(domain)
+            if not show_progress:
+                continue
+            now = time.monotonic()
+            if checked - last_printed < PROGRESS_EVERY and now - last_flush < PROGRESS_INTERVAL and checked < total:
+                continue
+            last_printed, last_flush = checked, now
+            if is_live:
+                sys.stdout.write(_LIVE_FMT.format(domain, protocol[:-3].upper(), checked, total))
+            elif domain:
+                sys.stdout.write(_DEAD_FMT.format(domain, checked, total))
+            else:
+                sys.stdout.write(_ERR_FMT.format(checked, total))
+            sys.stdout.flush()
     
     if show_progress:
         print(f"\n{Colors.GREEN}[+] Found {len(live_domains)} live domains out of {total} checked{Colors.ENDC}")
     
     return live_domains
 
+def filter_live_domains(domains, show_progress=True):
+    """Synchronous wrapper around filter_live_domains_async()."""
+    return asyncio.run(filter_live_domains_async(domains, show_progress))
+
 # === crt.sh fetch/parsing ===
+def _crtsh_cache_path(tld):
+    """Cache file for `tld`, or None if the TLD could escape CRTSH_CACHE_DIR."""
+    if ".." in tld or os.sep in tld or (os.altsep and os.altsep in tld):
+        return None
+    return os.path.join(CRTSH_CACHE_DIR, f"{tld}.json.gz")
+
+def load_crtsh_cache(tld):
+    """Return the cached domain set for `tld` if younger than CRTSH_CACHE_TTL, else None."""
+    path = _crtsh_cache_path(tld)
+    if path is None:
+        return None
+    try:
+        if time.time() - os.path.getmtime(path) > CRTSH_CACHE_TTL:
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return set(json.load(f))
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+def save_crtsh_cache(tld, domains):
+    """Atomically write the domain set for `tld` to the on-disk cache (best effort)."""
+    path = _crtsh_cache_path(tld)
+    if path is None:
+        return
+    tmp_name = None
+    try:
+        os.makedirs(CRTSH_CACHE_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=CRTSH_CACHE_DIR, suffix=".tmp", delete=False) as tmp:
+            tmp_name = tmp.name
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                json.dump(sorted(domains), f)
+        os.replace(tmp_name, path)
+    except (OSError, ValueError, TypeError) as e:
+        # don't leave the half-written temp file behind
+        if tmp_name is not None:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+        print(f"{Colors.YELLOW}[!] Could not cache crt.sh results for tld {tld}: {e}{Colors.ENDC}", file=sys.stderr)
+
 def fetch_from_crtsh(tld="com"):
     """
     Fetch JSON results from crt.sh searching for '%.<tld>' – returns a set of domains.
     crt.sh JSON fields: 'issuer_ca_id','issuer_name','common_name','name_value' etc.
     We'll parse name_value which can contain multiple domains separated by newline.
+    Results are cached on disk per TLD for CRTSH_CACHE_TTL seconds.
     """
+    cached = load_crtsh_cache(tld)
+    if cached is not None:
+        return cached
     q = quote_plus(f"%.{tld}")
     url = f"{CRT_SH_BASE}?q={q}&output=json"
     headers = {"User-Agent": USER_AGENT}
+    domains = set()
     try:
-        r = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-        time.sleep(SLEEP_BETWEEN_REQUESTS)
-        if r.status_code != 200:
-            # some deployments redirect to HTML if too many results; treat non-200 as failure
-            print(f"{Colors.RED}[!] crt.sh returned status {r.status_code} for tld {tld}{Colors.ENDC}", file=sys.stderr)
-            return set()
-        data = r.json()
-    except ValueError:
-        # invalid json or HTML returned
+        # stream the body so we stop reading once MAX_RESULTS_FETCH entries are parsed
+        with _SESSION.get(url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True) as r:
+            if r.status_code != 200:
+                # some deployments redirect to HTML if too many results; treat non-200 as failure
+                print(f"{Colors.RED}[!] crt.sh returned status {r.status_code} for tld {tld}{Colors.ENDC}", file=sys.stderr)
+                return set()
+            r.raw.decode_content = True
+            # the body is a list of objects – 'name_value' contains domain(s), possibly with wildcards or newlines
+            for i, entry in enumerate(ijson.items(r.raw, "item")):
+                if i >= MAX_RESULTS_FETCH:
+                    break
+                nv = entry.get("name_value")
+                if not nv:
+                    continue
+                # entries can contain multiple names separated by newline
+                domains.update(_NAME_RE.findall(nv.lower()))
+    except (ValueError, ijson.JSONError):
+        # invalid json or HTML returned (ijson.JSONError derives from Exception, not ValueError)
         print(f"{Colors.RED}[!] crt.sh returned non-JSON reply for tld {tld} – skipping.{Colors.ENDC}", file=sys.stderr)
         return set()
     except Exception as e:
         print(f"{Colors.RED}[!] Error fetching crt.sh for tld {tld}: {e}{Colors.ENDC}", file=sys.stderr)
         return set()
-
-    domains = set()
-    # data is a list of objects – 'name_value' contains domain(s), possibly with wildcards or newlines
-    for i, entry in enumerate(data):
-        if i >= MAX_RESULTS_FETCH:
-            break
-        nv = entry.get("name_value")
-        if not nv:
-            continue
-        # entries can contain multiple names separated by newline
-        for name in nv.splitlines():
-            name = name.strip().lower()
-            if not name:
-                continue
-            # strip leading wildcard if present
-            if name.startswith("*."):
-                name = name[2:]
-            # filter out IPs and short junk
-            if name.count(".") < 1:
-                continue
-            domains.add(name)
+    finally:
+        # polite delay, taken after the streamed response has been released
+        time.sleep(SLEEP_BETWEEN_REQUESTS)
+    # an empty result ('[]', an {"error": ...} object...) is not worth pinning for CRTSH_CACHE_TTL
+    if domains:
+        save_crtsh_cache(tld, domains)
     return domains
 
 # === Main logic ===
@@ -222,60 +395,105 @@ def collect_candidates(tlds):
     """Try crt.sh for each tld; build a candidate pool (deduped)."""
     pool = set()
     print(f"{Colors.CYAN}[*] Gathering candidate domains from crt.sh (may take a few seconds)...{Colors.ENDC}")
-    for tld in tlds:
-        print(f"{Colors.BLUE}    -> fetching .{tld} ...{Colors.ENDC}", end="", flush=True)
-        try:
-            found = fetch_from_crtsh(tld)
-            print(f"{Colors.GREEN} {len(found)}{Colors.ENDC}")
-            pool.update(found)
-        except Exception as e:
-            print(f"{Colors.RED} error: {e}{Colors.ENDC}")
+    # crt.sh queries are independent and I/O bound; run them side by side
+    with ThreadPoolExecutor(max_workers=CRTSH_WORKERS) as executor:
+        futures = [(tld, executor.submit(fetch_from_crtsh, tld)) for tld in tlds]
+        for tld, future in futures:
+            print(f"{Colors.BLUE}    -> fetching .{tld} ...{Colors.ENDC}", end="", flush=True)
+            try:
+                found = future.result()
+                print(f"{Colors.GREEN} {len(found)}{Colors.ENDC}")
+                pool.update(found)
+            except Exception as e:
+                print(f"{Colors.RED} error: {e}{Colors.ENDC}")
     print(f"{Colors.CYAN}[*] Total unique candidates fetched: {Colors.GREEN}{len(pool)}{Colors.ENDC}")
     return pool
 
+def _draw(pool, k):
+    """Remove and return up to `k` random items from `pool` (partial Fisher-Yates, O(k))."""
+    drawn = []
+    for _ in range(min(k, len(pool))):
+        i = random.randrange(len(pool))
+        pool[i], pool[-1] = pool[-1], pool[i]
+        drawn.append(pool.pop())
+    return drawn
+
+def _unseen(conn, domains):
+    """Drop domains already in the DB (one bulk lookup) or containing weird chars."""
+    seen_set = seen_fingerprints(conn, [_fp(d) for d in domains])
+    return [d for d in domains if _fp(d) not in seen_set and not _BAD_CHARS(d)]
+
+def _apex(domain):
+    """Rough registered domain: last two labels, or three for ccTLD second levels like co.uk."""
+    labels = domain.split(".")
+    if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL_LABELS:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+def _cap_per_apex(domains, apex_counts, limit):
+    """Split domains into those within `limit` variants per apex (counted in apex_counts) and the overflow."""
+    keep, overflow = [], []
+    for d in domains:
+        apex = _apex(d)
+        if apex_counts.get(apex, 0) < limit:
+            apex_counts[apex] = apex_counts.get(apex, 0) + 1
+            keep.append(d)
+        else:
+            overflow.append(d)
+    return keep, overflow
+
 def sample_new_domains(conn, candidates, count, verify_live=True):
-    """Return up to `count` domains from candidates that are not already in DB; mark and return them."""
-    candidates_list = list(candidates)
-    random.shuffle(candidates_list)
-    
-    # We'll collect more than needed to account for offline domains
-    # Reduced multiplier: 3x instead of 10x for faster processing
-    fetch_multiplier = 3 if verify_live else 1
-    fetch_count = count * fetch_multiplier
+    """
+    Return up to `count` domains from candidates that are not already in DB; mark and return them.
+    With live verification, candidates are checked in batches sized from the live rate observed so far,
+    up to count * MAX_PROBE_FACTOR probes in total.
+    Live checks also try at most MAX_PER_APEX hosts per registered domain until the pool runs dry.
+    """
+    pool = list(candidates)
+    out = []
+    checked = 0
+    # First probe assumes ~50% are live; later batches are sized from the measured rate
+    batch_size = count * 2 if verify_live else count
+    probe_budget = count * MAX_PROBE_FACTOR
+    apex_counts = {}
+    deferred = []
+    # the per-apex cap only saves probes, so it is pointless without verification
+    apex_limit = MAX_PER_APEX if verify_live else None
     
-    potential = []
-    for d in candidates_list:
-        if len(potential) >= fetch_count:
-            break
-        if already_seen(conn, d):
-            continue
-        # simple sanity filter: prefer domains without weird chars
-        if any(c in d for c in " <>\\\"'"):
+    while len(out) < count and (pool or deferred):
+        if not pool:
+            # every apex has had its share; backfill with the extra variants, uncapped
+            pool, deferred = deferred, []
+            apex_limit = None
+        draw_size = max(batch_size, MIN_SAMPLE_BATCH)
+        if verify_live:
+            draw_size = min(draw_size, probe_budget - checked)
+        batch = _unseen(conn, _draw(pool, draw_size))
+        if apex_limit is not None:
+            batch, overflow = _cap_per_apex(batch, apex_counts, apex_limit)
+            deferred.extend(overflow)
+        if not batch:
             continue
-        potential.append(d)
-    
-    # Filter for live domains if verification is enabled
-    if verify_live and potential:
-        live = filter_live_domains(potential)
-        # Mark as seen and return
-        out = []
-        for d in live:
-            if len(out) >= count:
+        if verify_live:
+            live = filter_live_domains(batch)
+            out.extend(live)
+            checked += len(batch)
+            if checked >= probe_budget:
                 break
-            success = mark_seen(conn, d)
-            if success:
-                out.append(d)
-        return out
-    else:
-        # No verification, just mark and return
-        out = []
-        for d in potential:
-            if len(out) >= count:
+            if not live and len(out) / checked <= MIN_LIVE_RATE:
+                # nothing is coming back live (e.g. outbound HTTP is down); leave it to main()'s DB fallback
                 break
-            success = mark_seen(conn, d)
-            if success:
-                out.append(d)
-        return out
+            live_rate = max(len(out) / checked, MIN_LIVE_RATE)
+            batch_size = math.ceil((count - len(out)) / live_rate)
+        else:
+            # No verification, take candidates as-is
+            out.extend(batch)
+            batch_size = count - len(out)
+    
+    out = out[:count]
+    # Mark as seen in a single transaction and return
+    mark_seen_bulk(conn, out)
+    return out
 
 def save_domains_to_file(domains):
     """Auto-save domains to a file with timestamp."""
@@ -317,10 +535,7 @@ def main():
     # If cache-only requested, collect unseen domains from DB by sampling rows not yet returned? We'll just read DB and say none left.
     if args.use_cache_only:
         print(f"{Colors.CYAN}[*] Using DB cache only (no remote fetch).{Colors.ENDC}")
-        cur = conn.cursor()
-        cur.execute("SELECT domain FROM seen_domains ORDER BY RANDOM() LIMIT ?", (args.count * 3 if verify_live else args.count,))
-        rows = cur.fetchall()
-        domains = [r[0] for r in rows]
+        domains = sample_db_fast(conn, args.count * 3 if verify_live else args.count)
         if not domains:
             print(f"{Colors.RED}[!] DB empty. Run once without --use-cache-only to populate cache.{Colors.ENDC}")
         else:
@@ -337,11 +552,8 @@ def main():
     if not candidates:
         # Nothing fetched; try to return previously-seen domains that weren't printed before.
         print(f"{Colors.YELLOW}[!] No new candidates fetched from crt.sh. Falling back to DB random selection.{Colors.ENDC}")
-        cur = conn.cursor()
-        cur.execute("SELECT domain FROM seen_domains ORDER BY RANDOM() LIMIT ?", (args.count * 3 if verify_live else args.count,))
-        rows = cur.fetchall()
-        domains = [r[0] for r in rows]
-        if rows:
+        domains = sample_db_fast(conn, args.count * 3 if verify_live else args.count)
+        if domains:
             if verify_live:
                 domains = filter_live_domains(domains)[:args.count]
             for d in domains:
@@ -357,17 +569,13 @@ def main():
     if len(selected) < args.count:
         need = args.count - len(selected)
         print(f"{Colors.YELLOW}[*] Only {len(selected)} new live domains available. Filling {need} from DB (already seen).{Colors.ENDC}")
-        cur = conn.cursor()
-        cur.execute("SELECT domain FROM seen_domains ORDER BY RANDOM() LIMIT ?", (need * 3 if verify_live else need,))
-        rows = cur.fetchall()
-        cached_domains = [r[0] for r in rows]
+        cached_domains = sample_db_fast(conn, need * 3 if verify_live else need)
         
         if verify_live and cached_domains:
             cached_live = filter_live_domains(cached_domains)
             selected.extend(cached_live[:need])
         else:
-            for r in rows[:need]:
-                selected.append(r[0])
+            selected.extend(cached_domains[:need])
 
     # Final output
     print(f"\n{Colors.BOLD}{Colors.CYAN}[*] Discovered Live Domains:{Colors.ENDC}\n")